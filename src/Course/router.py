@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import random
 from typing import Annotated, Callable, List
 
@@ -15,6 +16,7 @@ from fastapi import (
 )
 
 from src.constants import (
+    HTTP_SCHEME,
     HTTPS_SCHEME,
     MAX_TRAPS_TRIGGERED,
     Compressor,
@@ -53,6 +55,7 @@ from src.Graph.dependencies import (
 )
 from src.Graph.models import Node
 from src.Stores.interfaces import ICacheRepository
+from src.utils import netloc
 
 router = APIRouter(prefix="/course", tags=["course"])
 
@@ -93,9 +96,14 @@ async def course_begin(
     tasks: BackgroundTasks,
 ):
     """Initialize a tracker object for a playable course and perform modifications"""
-    G = resolver(request.app.state.compressor, True)
-    nodes_list = list(G.nodes)
-    source = Node(id=random.choice(nodes_list))
+    G = await asyncio.to_thread(resolver, request.app.state.compressor, True)
+    # the graph object is cached across requests; stash the node sequence
+    # on it so each course start skips the O(V) list(G.nodes) rebuild
+    nodes_list = G.graph.get("_node_seq", None)
+    if nodes_list is None:
+        nodes_list = tuple(G.nodes)
+        G.graph["_node_seq"] = nodes_list
+    source = Node(id=nodes_list[random.randrange(len(nodes_list))])
     tracker = CourseTracker(
         move_tracker=CourseMoveTracker(moves_target=moves_target),
         score_tracker=CourseScoreTracker(),
@@ -108,6 +116,7 @@ async def course_begin(
         modifiers_tracker=CourseModifiersTracker(),
     )
     course = CourseComplete(url=url, start_node=source, end_node=None, tracker=tracker)
+    request.app.state.active_courses[course.uid] = netloc(HTTP_SCHEME + url)
     tasks.add_task(
         initialize_course,
         course=course,
@@ -126,7 +135,7 @@ async def get_node_neighborhood(
     current_node: NodeInCourse,
     resolver: Annotated[nx.Graph, Depends(resolve_graph_from_course_object)],
 ):
-    G: nx.Graph = resolver(request.app.state.compressor, True)
+    G: nx.Graph = await asyncio.to_thread(resolver, request.app.state.compressor, True)
     cache_storage: ICacheRepository = request.app.state.cacheRepository
     course: CourseComplete = cache_storage.get_course(current_node.uid)
     if not course:
@@ -161,13 +170,14 @@ async def get_node_neighborhood(
     except KeyError:
         teleport_nodes = list()
 
+    distances = nx.single_source_shortest_path_length(G, course.start_node.id)
     adj_list = AdjListPoints(
         source=NodePoints(id=current_node.node.id, points=0),
         dest=[
             NodePoints(
                 id=neighbor,
                 points=calc_node_points(
-                    G, course.start_node.id, neighbor, teleport_nodes
+                    G, course.start_node.id, neighbor, teleport_nodes, distances
                 ),
             )
             for neighbor in G.neighbors(current_node.node.id)
@@ -215,9 +225,9 @@ async def move_into_node(
         )
         return course
 
-    G: nx.Graph = resolver(request.app.state.compressor, True)
+    G: nx.Graph = await asyncio.to_thread(resolver, request.app.state.compressor, True)
 
-    if nx.shortest_path_length(G, current_node.id, target_node.node.id) != 1:
+    if not G.has_edge(current_node.id, target_node.node.id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Nodes are not neighbors"
         )
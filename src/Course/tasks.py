@@ -2,7 +2,7 @@ import logging
 import random
 from datetime import datetime
 from functools import cached_property
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import networkx as nx
 
@@ -54,11 +54,11 @@ class CourseModHandler:
     def initialize_modifiers(self, graph: nx.Graph) -> None:
         target_distance = 3
         try:
+            distances = nx.single_source_shortest_path_length(
+                graph, self.course.start_node.id
+            )
             furthest_nodes = [
-                node
-                for node in graph.nodes()
-                if nx.shortest_path_length(graph, self.course.start_node.id, node)
-                >= target_distance
+                node for node, hops in distances.items() if hops >= target_distance
             ]
             traps_sample = random.sample(furthest_nodes, self.num_traps)
             powerups_sample = random.sample(
@@ -120,16 +120,25 @@ def initialize_course(
 
 
 def calc_node_points(
-    G: nx.Graph, start_node: str, neighbour: str, teleport_nodes: List[str] = list()
+    G: nx.Graph,
+    start_node: str,
+    neighbour: str,
+    teleport_nodes: List[str] = list(),
+    distances: Optional[Dict[str, int]] = None,
 ) -> int:
     """calculate node points based on the distance from spawn
     Increase points by 10 for every hop required
+    Callers scoring a whole neighborhood pass a precomputed distance map
+    from the start node, turning one BFS per neighbour into a dict lookup
     """
+    if neighbour in teleport_nodes:
+        return 0
+    if distances is not None:
+        hops = distances.get(neighbour, None)
+        return hops * 10 if hops else 0
     path = nx.shortest_path(G, source=start_node, target=neighbour)
     if not path:
         return 0
-    if neighbour in teleport_nodes:
-        return 0
     return (len(path) - 1) * 10
 
 
@@ -24,17 +24,6 @@ class ITaskQueue(Protocol):
         """Pushes a url into the task queue"""
         ...
 
-    async def process_queue(self):
-        """Iterate on the urls in the queue and process them in a separate thread
-        The capacity parameter indicates how many urls can be processed in concurrently
-        FIXME: Does not prevent an out of bounds call
-        Note:
-            Since I am not awaiting the task created by the loop.create_task() call, the capacity semaphore
-            is released before the task is done; after exiting the block.
-            This might be the reason the capacity is not respected
-        """
-        ...
-
     async def get_parsed_urls(self):
         """
         Access these variables from the crawler instance
@@ -1,19 +1,23 @@
 import asyncio
 import logging
+import os
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from importlib import import_module
+from hashlib import blake2b
 from types import ModuleType
 from typing import AsyncGenerator, List, Optional
-from urllib.parse import urljoin, urlparse
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlsplit, urlunsplit
 from urllib.robotparser import RobotFileParser
 
 import chardet
 import networkx as nx
 import orjson
-from httpx import AsyncClient, AsyncHTTPTransport, HTTPStatusError, RequestError
+from httpx import AsyncClient, AsyncHTTPTransport, HTTPStatusError, Limits, RequestError
 from lxml import html
-from lxml.cssselect import CSSSelector
-from lxml.etree import ParseError
+from lxml.etree import ParseError, XPath
 
 from src.constants import (
     GRAPH_ROOT,
@@ -21,32 +25,109 @@ from src.constants import (
     ConcurrentRequestLimit,
     CrawlDepth,
     compressor_extensions,
+    compressor_modules,
 )
+from src.Crawler.ratelimit import HostTokenBucket
 from src.Graph.models import AdjList, Node
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_parse_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+_hrefs = XPath("//a/@href")
+
+_robots_cache: dict[str, tuple[RobotFileParser, float]] = dict()
+_robots_ttl: float = 6 * 3600
+
+_slashes = re.compile(r"/+")
+
+
+def canonicalize(url: str) -> str:
+    """Collapse url variants that fetch the same resource onto one spelling
+    Lowercases scheme and host, drops default ports, empty queries and
+    fragments, collapses duplicate slashes and sorts the query pairs, so
+    the visited check does not refetch a page behind a cosmetic variation
+    """
+    p = urlsplit(url)
+    host = p.hostname.lower() if p.hostname else ""
+    if p.port and p.port not in (80, 443):
+        host = f"{host}:{p.port}"
+    path = _slashes.sub("/", p.path) or "/"
+    query = urlencode(sorted(parse_qsl(p.query)))
+    return urlunsplit((p.scheme.lower(), host, path, query, ""))
+
+
+def _url_digest(url: str) -> int:
+    """64-bit digest standing in for a visited url
+    A deep crawl keeps millions of visited entries; one small int per url
+    costs a fraction of the full string, and the 64-bit collision odds at
+    that scale are negligible for dedup purposes
+    """
+    return int.from_bytes(blake2b(url.encode(), digest_size=8).digest())
+
+
+def _extract_links(content: bytes, base_url: str, start_netloc: str) -> List[str]:
+    """Parse a page and return the same-site links found on it
+    Runs on the parse pool so the lxml work, which releases the GIL in the
+    C parser, does not stall the event loop between requests.
+    Takes the raw response bytes; lxml detects the charset itself from the
+    document, skipping the str decode and re-encode round trip
+    """
+    tree = html.document_fromstring(content)
+    links: List[str] = []
+    same_site = (
+        f"https://{start_netloc}/",
+        f"http://{start_netloc}/",
+        f"https://{start_netloc}",
+        f"http://{start_netloc}",
+    )
+    for href in _hrefs(tree):
+        full_url = urljoin(base_url, href, allow_fragments=False)
+        if "cdn-cgi" in full_url:
+            continue
+        if full_url.startswith(same_site[:2]) or full_url in same_site[2:]:
+            links.append(canonicalize(full_url))
+    return links
+
 
 class Crawler:
     def __init__(
-        self, client: AsyncClient, max_depth: int = 5, semaphore_size: int = 50
+        self,
+        client: AsyncClient,
+        max_depth: int = 5,
+        semaphore_size: int = 50,
+        limiter: Optional[HostTokenBucket] = None,
     ) -> None:
         self.client: AsyncClient = client
         self.max_depth: int = max_depth
         self.semaphore_size: int = semaphore_size
+        self.limiter: Optional[HostTokenBucket] = limiter
         self.robotparser: Optional[RobotFileParser] = None
-        self.graph: nx.Graph = nx.Graph()
+        self.adjacency: defaultdict[str, set[str]] = defaultdict(set)
         self.exclusion_list: List[str] = [".pdf", ".xml", ".jpg", ".png"]
 
-    async def parse_robotsfile(self) -> None:
-        """Create a parser instance to check against while crawling"""
+    async def parse_robotsfile(self, start_url: str) -> None:
+        """Create a parser instance to check against while crawling;
+        parsers are cached per host with a TTL so queued jobs for the same
+        site skip the refetch and reparse
+        """
+        host = urlparse(start_url).netloc
+        now = time.monotonic()
+        cached = _robots_cache.get(host, None)
+        if cached and now - cached[1] < _robots_ttl:
+            self.robotparser = cached[0]
+            return
         robotparser = RobotFileParser()
-        rbfile = await self.client.get("/robots.txt")
-        robotparser.parse(rbfile.text.split("\n") if rbfile.status_code == 200 else "")
+        rbfile = await self.client.get(urljoin(start_url, "/robots.txt"))
+        robotparser.parse(
+            rbfile.content.decode("utf-8", "replace").splitlines()
+            if rbfile.status_code == 200
+            else []
+        )
+        _robots_cache[host] = (robotparser, now)
         self.robotparser = robotparser
 
-    async def check_robots_compliance(self, url: str) -> bool:
+    def check_robots_compliance(self, url: str) -> bool:
         """Check if url is allowed by robots.txt
         :param url: url to check
         :return: bool
@@ -69,8 +150,10 @@ class Crawler:
             return False
 
         if test_connection_response.extensions["http_version"] == b"HTTP/2":
-            del self.client.headers["Keep-Alive"]
-            del self.client.headers["Connection"]
+            if "Keep-Alive" in self.client.headers:
+                del self.client.headers["Keep-Alive"]
+            if "Connection" in self.client.headers:
+                del self.client.headers["Connection"]
             logger.info("Set up headers for http/2")
 
         logger.info(
@@ -85,86 +168,84 @@ class Crawler:
                 return True
         return False
 
+    async def _process_page(
+        self, url: str, start_netloc: str, loop: asyncio.AbstractEventLoop
+    ) -> List[str]:
+        """Fetch a single page and return the same-site links found on it"""
+        p = urlparse(url, allow_fragments=False).path
+        logger.info(f"Crawling: {p}")
+        self.adjacency[url]  # the defaultdict insert registers the node
+
+        # TODO: check against exclusion list before the GET request -- Faster overall than a head request
+        if self.check_against_exclusion_list(p):
+            return []
+
+        links: List[str] = []
+        try:
+            if self.limiter:
+                await self.limiter.acquire(start_netloc)
+            async with self.client.stream("GET", url) as response:
+                if response.status_code != 200:
+                    logger.info(f"Non-200 response: {p}")
+                    return links
+                if "text/html" not in response.headers["Content-Type"]:
+                    logger.info(f"Not HTML: {p}")
+                    return links
+                if not self.check_robots_compliance(url):
+                    logger.info(f"Blocked by robots.txt: {p}")
+                    return links
+                content = await response.aread()
+            try:
+                links = await loop.run_in_executor(
+                    _parse_pool, _extract_links, content, url, start_netloc
+                )
+            except ParseError as e:
+                logger.error(e)
+                return links
+
+            self.adjacency[url].update(links)
+
+        except RequestError as e:
+            logger.error(e)
+        return links
+
     async def build_graph(self, start_url: str) -> None:
         """Function to run from the task queue to process a url and compress the graph
+        Fans the crawl out over a pool of worker tasks consuming a shared queue
+        of (url, depth) pairs; concurrency is bounded by the worker count, so
+        no slot is ever held by a task waiting on its children
         :param start_url: url to start from
         """
-        visited = set()
-        semaphore = asyncio.Semaphore(self.semaphore_size)
-
         if not await self.pre_crawl_setup(start_url):
             return
 
-        anchor_selector = CSSSelector("a[href]")
-
-        async def crawl(
-            crawler: Crawler,
-            url: str,
-            depth: int,
-        ) -> None:
-            """Recursive function to crawl a website and build a graph
-            :param depth: depth of recursion; how many calls shall be allowed
-            """
-            if depth > crawler.max_depth or url in visited:
-                return
+        start_netloc = urlparse(start_url).netloc
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[tuple[str, int]] = asyncio.Queue()
+        visited = {_url_digest(start_url)}
+        await queue.put((start_url, 0))
 
-            p = urlparse(url, allow_fragments=False).path
-            logger.info(f"Crawling: {p}")
-            visited.add(url)
-            crawler.graph.add_node(url)
-
-            # TODO: check against exclusion list before the GET request -- Faster overall than a head request
-            if self.check_against_exclusion_list(p):
-                return
-
-            try:
-                async with semaphore:
-                    response = await crawler.client.get(url)
-                if response.status_code != 200:
-                    logger.info(f"Non-200 response: {p}")
-                    return
-                if "text/html" not in response.headers["Content-Type"]:
-                    logger.info(f"Not HTML: {p}")
-                    return
-                if not await crawler.check_robots_compliance(url):
-                    logger.info(f"Blocked by robots.txt: {p}")
-                    return
+        async def worker() -> None:
+            while True:
+                url, depth = await queue.get()
                 try:
-                    tree = html.document_fromstring(response.text)
-                except ParseError as e:
-                    logger.error(e)
-                    return
-
-                for href in anchor_selector(tree):
-                    full_url = urljoin(url, href.attrib["href"], allow_fragments=False)
-                    next_url = urlparse(full_url, allow_fragments=False)
-                    if "cdn-cgi" in next_url.path:
-                        return
-                    if next_url.netloc == urlparse(start_url).netloc:
-                        crawler.graph.add_edge(url, full_url)
-                        await crawl(crawler, full_url, depth + 1)
-
-            except RequestError as e:
-                logger.error(e)
+                    links = await self._process_page(url, start_netloc, loop)
+                    if depth < self.max_depth:
+                        for link in links:
+                            digest = _url_digest(link)
+                            if digest not in visited:
+                                visited.add(digest)
+                                queue.put_nowait((link, depth + 1))
+                except Exception as e:
+                    logger.error(str(e)[:100])
+                finally:
+                    queue.task_done()
 
-        try:
-            async with asyncio.TaskGroup() as tg:
-                tg.create_task(crawl(self, start_url, 0))
-        except* ValueError as IPErrorGroup:
-            logger.error(
-                "Terminating due to error",
-                *[str(e)[:100] for e in IPErrorGroup.exceptions],
-            )
-        except* KeyError as HeaderMissingErrorGroup:
-            logger.error(
-                "Terminating due to error",
-                *[str(e)[:50] for e in HeaderMissingErrorGroup.exceptions],
-            )
-        except* ParseError as ParserErrorGroup:
-            logger.error(
-                "Terminating due to error",
-                *[str(e)[:100] for e in ParserErrorGroup.exceptions],
-            )
+        workers = [asyncio.create_task(worker()) for _ in range(self.semaphore_size)]
+        await queue.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
         return
 
     async def compress_graph(
@@ -173,14 +254,40 @@ class Crawler:
         compressor_module: ModuleType,
         extension: str,
     ) -> None:
-        """Save graph to disk in compressed format"""
-        if self.graph.number_of_nodes() <= 1:
+        """Save graph to disk in compressed format
+        The crawl accumulates a plain adjacency dict; the nx.Graph is
+        materialized once here, off the hot loop, instead of paying the
+        dict-of-dict bookkeeping on every add_edge during the crawl
+        """
+        if len(self.adjacency) <= 1:
             logger.info("Skipping compression, no graph nodes found")
             return
+        graph = nx.Graph()
+        graph.add_nodes_from(self.adjacency)
+        graph.add_edges_from(
+            (source, target)
+            for source, targets in self.adjacency.items()
+            for target in targets
+        )
+        # degree-1 nodes are the teleport candidates; computing them here,
+        # while the graph is already in memory, spares the info updater a
+        # full decompress, rebuild and degree scan per refresh
+        teleport_nodes = [node for node, degree in graph.degree() if degree == 1]
         file_name = (GRAPH_ROOT / file_name).as_posix()
-        data = nx.node_link_data(self.graph, edges="edges")
         with compressor_module.open(file_name + extension, "wb") as f:
-            f.write(orjson.dumps(data))
+            f.write(b'{"directed": false, "multigraph": false, "graph": ')
+            f.write(orjson.dumps({"teleport_nodes": teleport_nodes}))
+            f.write(b', "nodes": [')
+            for i, node in enumerate(graph.nodes()):
+                if i:
+                    f.write(b",")
+                f.write(orjson.dumps({"id": node}))
+            f.write(b'], "edges": [')
+            for i, (source, target) in enumerate(graph.edges()):
+                if i:
+                    f.write(b",")
+                f.write(orjson.dumps({"source": source, "target": target}))
+            f.write(b"]}")
 
 
 @asynccontextmanager
@@ -196,7 +303,10 @@ async def generate_client(
         "Accept-Encoding": "gzip, deflate, br",
         "Accept-Language": "en, el-GR;q=0.9",
     }
-    transport = AsyncHTTPTransport(retries=3, http2=True)
+    limits = Limits(
+        max_connections=10, max_keepalive_connections=10, keepalive_expiry=60
+    )
+    transport = AsyncHTTPTransport(retries=3, http2=True, limits=limits)
     client = AsyncClient(
         base_url=base_url,
         transport=transport,
@@ -212,34 +322,56 @@ async def generate_client(
         await client.aclose()
 
 
+async def _crawl_and_compress(
+    client: AsyncClient,
+    url: str,
+    compressor: Compressor,
+    crawl_depth: CrawlDepth,
+    request_limit: ConcurrentRequestLimit,
+    limiter: Optional[HostTokenBucket] = None,
+) -> None:
+    compressor_module = compressor_modules[compressor.value]
+    crawler = Crawler(
+        client=client,
+        max_depth=crawl_depth.value,
+        semaphore_size=request_limit.value,
+        limiter=limiter,
+    )
+    await crawler.parse_robotsfile(url)
+    logger.info("Crawling Website")
+    await crawler.build_graph(url)
+    logger.info("Compressing Graph")
+    await crawler.compress_graph(
+        urlparse(url).netloc,
+        compressor_module,
+        compressor_extensions[compressor],
+    )
+
+
 async def process_url(
     url: str,
     compressor: Compressor,
     crawl_depth: CrawlDepth,
     request_limit: ConcurrentRequestLimit,
+    client: Optional[AsyncClient] = None,
+    limiter: Optional[HostTokenBucket] = None,
 ) -> None:
     """Function to run from the task queue to process a url and compress the graph
     Contains all necessary steps to crawl a website and save a graph to disk in a
     compressed format
     :param url: base url to crawl
     :param compressor: compressor module to use
-    :return: Future (in separate thread)
+    :param client: optional long-lived client; falls back to a throwaway one
+    :param limiter: optional per-host token bucket throttling the requests
     """
-    compressor_module = import_module(compressor.value)
-    async with generate_client(url) as client:
-        crawler = Crawler(
-            client=client,
-            max_depth=crawl_depth.value,
-            semaphore_size=request_limit.value,
+    if client is not None:
+        await _crawl_and_compress(
+            client, url, compressor, crawl_depth, request_limit, limiter
         )
-        await crawler.parse_robotsfile()
-        logger.info("Crawling Website")
-        await crawler.build_graph(url)
-        logger.info("Compressing Graph")
-        await crawler.compress_graph(
-            urlparse(url).netloc,
-            compressor_module,
-            compressor_extensions[compressor],
+        return
+    async with generate_client() as client:
+        await _crawl_and_compress(
+            client, url, compressor, crawl_depth, request_limit, limiter
         )
 
 
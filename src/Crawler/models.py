@@ -1,6 +1,18 @@
+from dataclasses import dataclass
+
 from pydantic import BaseModel
 
 
 class QueueUrl(BaseModel):
     url: str
     force: bool = False
+
+
+@dataclass(slots=True)
+class QueueAck:
+    """Internal response record; serialized natively by orjson,
+    skipping the intermediate dict build on the queue hot path
+    """
+
+    message: str
+    position: int
@@ -1,21 +1,26 @@
 import asyncio
 import logging
-from contextlib import asynccontextmanager
-from enum import StrEnum, auto
-from typing import AsyncGenerator
+from collections import deque
+from enum import IntEnum, auto
+from typing import Optional
 
 from src.constants import Compressor, ConcurrentRequestLimit, CrawlDepth
-from src.Crawler.lib import process_url
+from src.Crawler.lib import generate_client, process_url
+from src.Crawler.ratelimit import HostTokenBucket
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class State(StrEnum):
+class State(IntEnum):
     FULL = auto()
     AVAILABLE = auto()
 
 
+_STATE_FULL = State.FULL
+_STATE_AVAILABLE = State.AVAILABLE
+
+
 class TaskQueue:
     def __init__(
         self,
@@ -24,72 +29,95 @@ class TaskQueue:
         crawl_depth=CrawlDepth.AVERAGE,
         request_limit=ConcurrentRequestLimit.AVERAGE,
     ):
-        self.queue = asyncio.Queue()
+        self.queue: deque[str] = deque()
+        self.maxsize: int = capacity * 4
         self.capacity: int = capacity
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._unfinished: int = 0
         self.compressor: Compressor = compressor
         self.crawl_depth = crawl_depth
         self.request_limit = request_limit
+        self._semaphore = asyncio.BoundedSemaphore(capacity)
+        self._supervisor: Optional[asyncio.Task] = None
+        self.limiter = HostTokenBucket()
 
     @property
     def state(self) -> State:
-        match self.capacity:
-            case 0:
-                return State.FULL
-            case _:
-                return State.AVAILABLE
-
-    @asynccontextmanager
-    async def on_queue_push(self) -> AsyncGenerator[None, None]:
-        try:
-            yield
-        finally:
-            if self.state == State.AVAILABLE:
-                await self.process_queue()
-
-    @asynccontextmanager
-    async def capacity_semaphore(self) -> AsyncGenerator[None, None]:
-        self.capacity -= 1
-        try:
-            yield
-        except Exception:
-            pass
-        finally:
-            self.capacity += 1
+        return _STATE_FULL if self._semaphore._value == 0 else _STATE_AVAILABLE
 
     def get_size(self) -> int:
-        return self.queue.qsize()
+        return len(self.queue)
 
     def get_capacity(self) -> int:
-        return self.capacity
-
-    def task_done(self, future) -> None:
-        logger.info("Future finished")
-        self.queue.task_done()
-        self.capacity += 1
-        if self.get_size() > 0:
-            asyncio.get_running_loop().create_task(self.process_queue())
+        return self._semaphore._value
 
-    async def push_url(self, url: str) -> None:
-        """Pushes a url into the task queue"""
-        async with self.on_queue_push():
-            await self.queue.put(url)
+    def _ensure_workers(self) -> None:
+        """Spawn the supervisor of the consumer tasks on first use;
+        Requires a running event loop, hence not part of __init__
+        """
+        if self._supervisor:
+            return
+        self._supervisor = asyncio.get_running_loop().create_task(self._supervise())
 
-    async def process_queue(self):
-        """Iterate on the urls in the queue and process them in a separate thread
-        The capacity parameter indicates how many urls can be processed in concurrently
+    async def _supervise(self) -> None:
+        """Hold the consumer tasks in one structured scope so references are
+        kept alive and worker failures surface instead of vanishing
         """
-        self.capacity -= 1
         try:
-            url = await self.queue.get()
-            loop = asyncio.get_running_loop()
-            task = loop.create_task(
-                process_url(url, self.compressor, self.crawl_depth, self.request_limit)
-            )
-            task.add_done_callback(self.task_done)
-        except Exception as e:
-            logger.error(e)
-        finally:
-            pass
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(self.capacity):
+                    tg.create_task(self._worker())
+        except* Exception as WorkerErrorGroup:
+            for e in WorkerErrorGroup.exceptions:
+                logger.error(e)
+
+    async def _worker(self) -> None:
+        """Long-lived consumer; pops urls from the queue and processes them
+        under the capacity semaphore.
+        Holds a single pooled http client for its whole lifetime so sockets
+        and DNS lookups are reused across queued urls
+        """
+        async with generate_client() as client:
+            while True:
+                while not self.queue:
+                    self._not_empty.clear()
+                    await self._not_empty.wait()
+                url = self.queue.popleft()
+                if len(self.queue) < self.maxsize:
+                    self._not_full.set()
+                try:
+                    async with self._semaphore:
+                        await process_url(
+                            url,
+                            self.compressor,
+                            self.crawl_depth,
+                            self.request_limit,
+                            client=client,
+                            limiter=self.limiter,
+                        )
+                except Exception as e:
+                    logger.error(e)
+                finally:
+                    self._unfinished -= 1
+                    if self._unfinished == 0:
+                        self._idle.set()
+
+    async def push_url(self, url: str) -> None:
+        """Pushes a url into the task queue;
+        Blocks when the queue is full, applying back-pressure on producers
+        """
+        self._ensure_workers()
+        while len(self.queue) >= self.maxsize:
+            self._not_full.clear()
+            await self._not_full.wait()
+        self.queue.append(url)
+        self._unfinished += 1
+        self._idle.clear()
+        self._not_empty.set()
 
     async def get_parsed_urls(self):
         """
@@ -102,7 +130,7 @@ class TaskQueue:
 
     async def get_status(self):
         return {
-            "state": self.state,
+            "state": self.state.name.lower(),
             "size": self.get_size(),
         }
 
@@ -111,4 +139,9 @@ class TaskQueue:
         Waits until all taskes inside the queue are executed
         """
         logger.info("Shutting down Task Queue")
-        # TODO: cancel all running task
+        if not self._supervisor:
+            return
+        await self._idle.wait()
+        self._supervisor.cancel()
+        await asyncio.gather(self._supervisor, return_exceptions=True)
+        self._supervisor = None
@@ -0,0 +1,28 @@
+import asyncio
+import time
+from typing import Dict, Tuple
+
+
+class HostTokenBucket:
+    """Token bucket rate limiter keyed by target host
+    Every host owns `burst` tokens, refilled at `rate` tokens per second;
+    acquire consumes one token and sleeps until one is available
+    """
+
+    def __init__(self, rate: float = 0.67, burst: int = 5) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = dict()
+
+    async def acquire(self, host: str) -> None:
+        """Take a token for the given host, waiting out the refill if empty"""
+        now = time.monotonic()
+        tokens, last = self._buckets.get(host, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+        # debit before sleeping, letting the balance go negative, so
+        # concurrent acquirers see the reservation and queue behind it
+        # instead of all sleeping the same deficit and granting
+        # themselves a token at once
+        self._buckets[host] = (tokens - 1, now)
+        if tokens < 1:
+            await asyncio.sleep((1 - tokens) / self.rate)
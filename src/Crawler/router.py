@@ -3,9 +3,9 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, Request
 from fastapi.exceptions import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
-from src.Crawler.models import QueueUrl
+from src.Crawler.models import QueueAck, QueueUrl
 from src.Graph.dependencies import url_not_in_crawled_from_object, validate_url
 
 router = APIRouter(prefix="/crawl", tags=["crawler"])
@@ -28,12 +28,12 @@ async def queue_website(
         await request.app.state.task_queue.push_url(queue_url.url)
     except Exception as e:
         logger.error(e)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=201,
-        content={
-            "message": "Queued for Crawling",
-            "position": request.app.state.task_queue.get_size(),
-        },
+        content=QueueAck(
+            message="Queued for Crawling",
+            position=request.app.state.task_queue.get_size(),
+        ),
     )
 
 
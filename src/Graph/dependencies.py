@@ -1,14 +1,17 @@
 from __future__ import annotations
 
-from importlib import import_module
-from json import JSONDecodeError
+import os
+import pickle
+import re
+import sys
+from functools import lru_cache
 from types import ModuleType
 from typing import Annotated, Callable, List, Optional
 from urllib.parse import ParseResult, urlparse
 
 import orjson
 from fastapi import Depends, HTTPException, Request
-from networkx import Graph, node_link_graph
+from networkx import Graph
 
 from src.constants import (
     GRAPH_ROOT,
@@ -16,36 +19,67 @@ from src.constants import (
     HTTPS_SCHEME,
     Compressor,
     compressor_extensions,
+    compressor_modules,
 )
+from src.utils import netloc
 
+_url_fast = re.compile(r"^https?://[^/\s?#]+")
 
-async def validate_url(request: Request) -> None:
+
+async def parsed_body(request: Request) -> dict:
+    """
+    Parse the request body exactly once per request with orjson and memoize
+    the result on request.state, so stacked dependencies do not re-read and
+    re-parse the same body
+
+    Args:
+        request (Request): Request object from FastAPI
+
+    Raises:
+        HTTPException: Request body is not valid JSON
+
+    Returns:
+        dict: The parsed request body
+    """
+    body = getattr(request.state, "_body_json", None)
+    if body is None:
+        raw = await request.body()
+        try:
+            body = orjson.loads(raw)
+        except orjson.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        request.state._body_json = body
+    return body
+
+
+async def validate_url(body: Annotated[dict, Depends(parsed_body)]) -> None:
     """
     Basic url validation; Returns if url passed in the request body is valid
 
     Args:
-        request: Request object from FastAPI
+        body (dict): Parsed request body
 
     Raises:
         HTTPException: Url is not present in request body
         HTTPException: Url validation by urlparse failed to detect necessary attributes
     """
-    try:
-        req = await request.json()
-    except JSONDecodeError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    result = urlparse(req.get("url", None))
+    url = body.get("url", None)
+    if url and _url_fast.match(url):
+        return
+    result = urlparse(url)
     if not result.scheme:
         raise HTTPException(status_code=400, detail="Url not present in request body")
-    try:
-        all([result.scheme, result.netloc])
-    except ValueError:
+    if not result.netloc:
         raise HTTPException(status_code=400, detail="Invalid URL")
 
 
+_list_cache: dict[tuple[int, str], List[str]] = dict()
+
+
 async def get_crawled_urls(request: Request) -> List[str]:
     """
-    Returns list of already crawled urls
+    Returns list of already crawled urls; the directory scan is memoized on
+    the GRAPH_ROOT mtime so it only re-runs when a graph is added or removed
 
     Args:
         request (Request): Request object from FastAPI
@@ -54,11 +88,20 @@ async def get_crawled_urls(request: Request) -> List[str]:
         List[str]: List of already crawled urls present in the storage medium
     """
     compressor = request.app.state.compressor.value
-    return [
-        graph.stem
-        for graph in GRAPH_ROOT.iterdir()
-        if graph.is_file() and graph.suffix == compressor_extensions[compressor]
-    ]
+    extension = compressor_extensions[compressor]
+    key = (os.stat(GRAPH_ROOT).st_mtime_ns, compressor)
+    cached = _list_cache.get(key, None)
+    if cached is not None:
+        return cached
+    with os.scandir(GRAPH_ROOT) as entries:
+        urls = [
+            entry.name.removesuffix(extension)
+            for entry in entries
+            if entry.is_file() and entry.name.endswith(extension)
+        ]
+    _list_cache.clear()
+    _list_cache[key] = urls
+    return urls
 
 
 async def url_in_crawled(
@@ -74,20 +117,20 @@ async def url_in_crawled(
     Raises:
         HTTPException: Website not yet crawled
     """
-    parsed: ParseResult = urlparse(url)
-    if parsed.netloc not in crawled_urls:
+    if netloc(url) not in crawled_urls:
         raise HTTPException(status_code=404, detail="Website not yet crawled")
     return
 
 
 async def url_in_crawled_from_object(
-    request: Request, crawled_urls: Annotated[List[str], Depends(get_crawled_urls)]
+    body: Annotated[dict, Depends(parsed_body)],
+    crawled_urls: Annotated[List[str], Depends(get_crawled_urls)],
 ) -> None:
     """
     Check if a url passed in the request body is already crawled
 
     Args:
-        request (Request): Request object from FastAPI
+        body (dict): Parsed request body
         crawled_urls ([List[str]): The list of already crawled urls that runs as a fastapi dependency
 
     Returns:
@@ -97,11 +140,7 @@ async def url_in_crawled_from_object(
         HTTPException: Url is not present in request body
         HTTPException: Website not yet crawled
     """
-    try:
-        req = await request.json()
-    except JSONDecodeError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    url = req.get("url", None)
+    url = body.get("url", None)
     if not url:
         raise HTTPException(status_code=400, detail="Url not present in request body")
     parsed: ParseResult = urlparse(url)
@@ -113,13 +152,14 @@ async def url_in_crawled_from_object(
 
 
 async def url_not_in_crawled_from_object(
-    request: Request, crawled_urls: Annotated[List[str], Depends(get_crawled_urls)]
+    body: Annotated[dict, Depends(parsed_body)],
+    crawled_urls: Annotated[List[str], Depends(get_crawled_urls)],
 ) -> None:
     """
     Check if a url passed in the request body is already crawled
 
     Args:
-        request (Request): Request object from FastAPI
+        body (dict): Parsed request body
         crawled_urls ([List[str]): The list of already crawled urls that runs as a fastapi dependency
 
     Returns:
@@ -129,11 +169,7 @@ async def url_not_in_crawled_from_object(
         HTTPException: Url is not present in request body
         HTTPException: Website is already crawled
     """
-    try:
-        req = await request.json()
-    except JSONDecodeError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    url = req.get("url", None)
+    url = body.get("url", None)
     if not url:
         raise HTTPException(status_code=400, detail="Url not present in request body")
     parsed: ParseResult = urlparse(url)
@@ -165,11 +201,63 @@ def extract_graph(
     """
     if not url_crawled:
         return
-    parsed: ParseResult = urlparse(url)
-    file_name = (GRAPH_ROOT / parsed.netloc).as_posix()
-    with compressor_module.open(file_name + extension, "rb") as compressed:
-        contents = compressed.read()
-        G = node_link_graph(orjson.loads(contents), edges="edges")
+    file_name = (GRAPH_ROOT / netloc(url)).as_posix()
+    mtime_ns = os.stat(file_name + extension).st_mtime_ns
+    return _load_graph(file_name, extension, compressor_module, mtime_ns)
+
+
+@lru_cache(maxsize=64)
+def _load_graph(
+    file_name: str,
+    extension: str,
+    compressor_module: ModuleType,
+    mtime_ns: int,
+) -> Graph:
+    """
+    Decompress, parse and build the graph for a stored node-link file;
+    memoized on the file mtime so hot urls skip all three stages. Cached
+    instances are shared, so callers must treat the Graph as read-only
+
+    A binary .pickle sidecar is kept next to the compressed blob; loads that
+    miss the in-memory cache (e.g. after a restart) read the pickled Graph
+    directly and skip the decompress + JSON parse + rebuild entirely. The
+    node-link JSON stays the canonical format; a stale or corrupt sidecar is
+    ignored and rewritten
+
+    Args:
+        file_name (str): path of the stored graph, without extension
+        extension (str): compressed file extension, matches compressor module
+        compressor_module (ModuleType): compressor module used application wide
+        mtime_ns (int): file mtime, invalidates the cache entry on recrawl
+
+    Returns:
+        networkx.Graph:
+    """
+    sidecar = file_name + ".pickle"
+    try:
+        if os.stat(sidecar).st_mtime_ns > mtime_ns:
+            with open(sidecar, "rb") as f:
+                return pickle.load(f)
+    except Exception:
+        # a truncated or corrupt sidecar (EOFError, UnpicklingError, even
+        # AttributeError from a stale class path) must never poison the
+        # load; fall through and rebuild it from the canonical JSON
+        pass
+    with open(file_name + extension, "rb", buffering=1 << 20) as raw:
+        with compressor_module.open(raw, "rb") as compressed:
+            data = orjson.loads(compressed.read())
+    G = Graph()
+    G.add_nodes_from(node["id"] for node in data["nodes"])
+    G.add_edges_from((edge["source"], edge["target"]) for edge in data["edges"])
+    try:
+        # dump to a temp path and rename so a crash mid-write can never
+        # leave a half-written sidecar in place of a valid one
+        tmp = sidecar + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(G, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, sidecar)
+    except OSError:
+        pass
     return G
 
 
@@ -199,7 +287,7 @@ class GraphResolver:
         Returns:
             networkx.Graph: Graph assotiated with the url
         """
-        compressor_module: ModuleType = import_module(compressor.value)
+        compressor_module: ModuleType = compressor_modules[compressor.value]
         G: Optional[Graph] = extract_graph(
             self.url,
             compressor_module=compressor_module,
@@ -211,20 +299,78 @@ class GraphResolver:
 
         return G
 
+    def raw_bytes(self, compressor: Compressor) -> bytes:
+        """
+        Return the stored node-link JSON for the url as decompressed bytes,
+        without deserializing into a Graph; read endpoints that only proxy
+        the stored graph can hand these straight to a Response
+
+        Args:
+            compressor (Compressor): Compressor Enum type
+
+        Raises:
+            HTTPException: Website not yet crawled
+
+        Returns:
+            bytes: The decompressed node-link JSON document
+        """
+        compressor_module: ModuleType = compressor_modules[compressor.value]
+        file_name = (GRAPH_ROOT / netloc(self.url)).as_posix()
+        extension = compressor_extensions[compressor.value]
+        try:
+            with open(file_name + extension, "rb", buffering=1 << 20) as raw:
+                with compressor_module.open(raw, "rb") as compressed:
+                    return compressed.read()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Website not yet crawled")
+
+    def stored_bytes(self, compressor: Compressor) -> bytes:
+        """
+        Return the stored graph file exactly as it sits on disk, still
+        compressed; lets an endpoint serve a gzip blob with
+        Content-Encoding set and skip the decompress/recompress round trip
+
+        Args:
+            compressor (Compressor): Compressor Enum type
+
+        Raises:
+            HTTPException: Website not yet crawled
+
+        Returns:
+            bytes: The compressed node-link JSON document
+        """
+        file_name = (GRAPH_ROOT / netloc(self.url)).as_posix()
+        extension = compressor_extensions[compressor.value]
+        try:
+            with open(file_name + extension, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Website not yet crawled")
+
 
 async def graph_resolvers(
+    request: Request,
     crawled_urls: Annotated[List[str], Depends(get_crawled_urls)],
 ) -> dict[str, GraphResolver]:
     """
-    Return dictionary of GraphResolver callables, initiated for every crawled url
+    Return dictionary of GraphResolver callables, initiated for every crawled url;
+    kept on app.state and rebuilt only when the graph directory changes on disk
 
     Args:
+        request (Request): Request object from FastAPI
         crawled_urls (List[str]): List of already crawled urls
 
     Returns:
         dict[str, GraphResolver]: Dictionary of pre-computed GraphResolver callables
     """
-    return {url: GraphResolver(HTTPS_SCHEME + url) for url in crawled_urls}
+    state = request.app.state
+    mtime = os.stat(GRAPH_ROOT).st_mtime_ns
+    if getattr(state, "resolvers_mtime", None) != mtime:
+        state.resolvers = {
+            sys.intern(url): GraphResolver(HTTPS_SCHEME + url) for url in crawled_urls
+        }
+        state.resolvers_mtime = mtime
+    return state.resolvers
 
 
 async def get_resolver(
@@ -245,7 +391,7 @@ async def get_resolver(
         Callable[[Compressor, bool], Graph]: GraphResolver callable
     """
     try:
-        return resolvers[urlparse(url).netloc]
+        return resolvers[netloc(url)]
     except KeyError:
         raise HTTPException(
             status_code=400, detail="Unexpected error: Unable to resolve url"
@@ -253,14 +399,14 @@ async def get_resolver(
 
 
 async def get_resolver_from_object(
-    request: Request,
+    body: Annotated[dict, Depends(parsed_body)],
     resolvers: Annotated[dict[str, GraphResolver], Depends(graph_resolvers)],
 ) -> Callable[[Compressor, bool], Graph]:
     """
     Returns the corresponding GraphResolver instance for the given url passed inside the request body
 
     Args:
-        request (Request): Request object from FastAPI
+        body (dict): Parsed request body
         resolvers (Dict[str, GraphResolver]): Dictionary of pre-computed GraphResolver callables
 
     Raises:
@@ -269,14 +415,10 @@ async def get_resolver_from_object(
     Returns:
         Callable[[Compressor, bool], Graph]: GraphResolver callable
     """
-    try:
-        res = await request.json()
-    except JSONDecodeError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    url = res.get("url", None)
+    url = body.get("url", None)
     if not url:
         raise HTTPException(status_code=400, detail="Url not present in request body")
-    resolver = resolvers.get(urlparse(HTTP_SCHEME + url).netloc, None)
+    resolver = resolvers.get(netloc(HTTP_SCHEME + url), None)
     if not resolver:
         raise HTTPException(
             status_code=400, detail="Unexpected error: Unable to resolve url"
@@ -305,12 +447,15 @@ async def resolve_course_url(request: Request, uid: str) -> str:
     return request.app.state.active_courses[uid]
 
 
-async def resolve_course_url_object(request: Request) -> str:
+async def resolve_course_url_object(
+    request: Request, body: Annotated[dict, Depends(parsed_body)]
+) -> str:
     """
     Search the running courses for given course uid given inside the request body and return the url
 
     Args:
         request (Request): Request object from FastAPI
+        body (dict): Parsed request body
 
     Raises:
         HTTPException: ID does not correspond to an active course
@@ -318,11 +463,7 @@ async def resolve_course_url_object(request: Request) -> str:
     Returns:
         str: url of the active course
     """
-    try:
-        res = await request.json()
-    except JSONDecodeError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    uid = res.get("uid", None)
+    uid = body.get("uid", None)
     if not uid:
         raise HTTPException(status_code=400, detail="Uid not present in request body")
     if uid not in request.app.state.active_courses.keys():
@@ -354,7 +495,7 @@ async def resolve_graph_from_course(
         Callable[[Compressor, bool], Graph]: GraphResolver callable
     """
     try:
-        return resolvers[urlparse(HTTPS_SCHEME + course_url).netloc]
+        return resolvers[netloc(HTTPS_SCHEME + course_url)]
     except KeyError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -380,6 +521,6 @@ async def resolve_graph_from_course_object(
         Callable[[Compressor, bool], Graph]: GraphResolver callable
     """
     try:
-        return resolvers[urlparse(HTTP_SCHEME + course_url).netloc]
+        return resolvers[netloc(HTTP_SCHEME + course_url)]
     except KeyError as e:
         raise HTTPException(status_code=400, detail=str(e))
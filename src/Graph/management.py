@@ -2,46 +2,129 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import os
 import random
-from concurrent.futures import ThreadPoolExecutor
-from importlib import import_module
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+from itertools import chain
 from pathlib import Path
-from typing import Callable, Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 
-import networkx as nx
 import orjson
 from watchfiles import Change, DefaultFilter, awatch
 
-from src.constants import GRAPH_ROOT, HTTPS_SCHEME, Compressor, compressor_extensions
-from src.Graph.dependencies import GraphResolver
+from src.constants import (
+    GRAPH_ROOT,
+    Compressor,
+    compressor_extensions,
+    compressor_modules,
+)
 from src.Graph.models import GraphInfo, Node
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _resolve_graph_info(graph: Path, compressor: Compressor) -> Optional[GraphInfo]:
+    """Resolve graph information for one stored graph
+    Module level so the info updater can fan it out over worker processes:
+    the json decode and the pure-Python degree scan hold the GIL, so
+    threads would serialize where processes run truly in parallel.
+    The result is memoized to a tiny .info.json sidecar, so restarts and
+    re-validations of unchanged blobs skip the full decompress and parse
+    """
+    sidecar = graph.with_suffix(".info.json")
+    try:
+        if sidecar.stat().st_mtime_ns >= graph.stat().st_mtime_ns:
+            return GraphInfo(**orjson.loads(sidecar.read_bytes()))
+    except Exception:
+        # a sidecar that is unreadable, corrupt or from a stale schema
+        # (ValidationError) must never escape the worker; fall through
+        # and rebuild the info from the canonical blob
+        pass
+    try:
+        data = orjson.loads(
+            compressor_modules[compressor.value].decompress(graph.read_bytes())
+        )
+    except Exception as e:
+        # the cleaner runs concurrently and may sweep a dirty blob away
+        # between the directory scan and this read, or the stream itself
+        # may be corrupt; either way this file yields no info
+        logger.error(f"{e} -> {graph.stem}")
+        return None
+    candidates = data.get("graph", dict()).get("teleport_nodes", None)
+    try:
+        if candidates is None:
+            # graphs written before the candidates were persisted: one
+            # C-level Counter pass over the edges already in hand replaces
+            # the old nx.Graph rebuild and per-node degree lookups
+            counts = Counter(
+                chain.from_iterable(
+                    (edge["source"], edge["target"]) for edge in data["edges"]
+                )
+            )
+            candidates = [node for node, degree in counts.items() if degree == 1]
+        limit = len(candidates) // 100
+        info = GraphInfo(
+            num_nodes=len(data["nodes"]),
+            num_edges=len(data["edges"]),
+            teleport_nodes=[
+                Node(id=node) for node in random.sample(candidates, limit)
+            ],
+        )
+    except Exception as e:
+        logger.error(f"{e} -> {graph.stem}")
+        return None
+    try:
+        sidecar.write_bytes(orjson.dumps(info.model_dump()))
+    except OSError as e:
+        logger.error(f"Could not write info sidecar: {e} -> {graph.stem}")
+    return info
+
+
 class GraphFilterExtension(DefaultFilter):
     allowed_extensions = ".gz", ".xz"
 
     def __call__(self, change: Change, path: str) -> bool:
-        return super().__call__(change, path) and path.endswith(self.allowed_extensions)
+        # the cheap suffix probe rejects most events before the
+        # regex-backed default filter ever runs
+        if not path.endswith(self.allowed_extensions):
+            return False
+        return super().__call__(change, path)
 
 
 class GraphManager:
     def __init__(self, compressor: Compressor, processes: Optional[int] = None) -> None:
         self.compressor = compressor
+        self._decompress = compressor_modules[compressor.value].decompress
+        self._ext = compressor_extensions[compressor.value]
         self.pool = ThreadPoolExecutor(max_workers=processes)
         self.graphs: List[Path] = None
         self.available = True
-        self.parsed: set[Path] = set()
+        self.parsed: Dict[Path, int] = dict()
 
     def _collect_graphs(self) -> None:
-        self.graphs = [
-            graph
-            for graph in GRAPH_ROOT.iterdir()
-            if graph.is_file()
-            and graph.suffix == compressor_extensions[self.compressor.value]
-        ]
+        """List the stored graphs via scandir, whose DirEntry carries the
+        file type from the directory read itself — one syscall per listing
+        instead of one stat per entry
+        """
+        with os.scandir(GRAPH_ROOT) as entries:
+            self.graphs = [
+                Path(entry.path)
+                for entry in entries
+                if entry.is_file(follow_symlinks=False)
+                and entry.name.endswith(self._ext)
+            ]
+
+    def _mark_parsed(self, graph: Path) -> None:
+        """Remember the mtime a graph was processed at; a rewritten file
+        no longer matches and re-enters the next full scan
+        """
+        try:
+            self.parsed[graph] = graph.stat().st_mtime_ns
+        except FileNotFoundError:
+            self.parsed.pop(graph, None)
 
     async def stop(self) -> None:
         """Force shutdown of the executor"""
@@ -51,26 +134,67 @@ class GraphManager:
 
 
 class GraphCleaner(GraphManager):
+    def __init__(self, compressor: Compressor, processes: Optional[int] = None) -> None:
+        super().__init__(compressor, processes)
+        self.validated: Dict[Path, int] = dict()
+
     def _sweep_dirty_graph(self, graph: Path) -> None:
-        """Detect graphs with invalid json data"""
-        compressor_module = import_module(self.compressor.value)
-        with compressor_module.open(graph, "rb") as f:
-            try:
-                orjson.loads(f.read())
-            except orjson.JSONDecodeError:
-                graph.unlink()
-
-    def sweep(self, force: bool = False):
-        self._collect_graphs()
-        if not force:
-            remaining = [graph for graph in self.graphs if graph not in self.parsed]
+        """Detect graphs with invalid json data
+        A file whose mtime still matches its last successful validation is
+        known good and skipped outright; only new or rewritten blobs pay
+        for the decompress and full parse
+        """
+        try:
+            mtime = graph.stat().st_mtime_ns
+        except FileNotFoundError:
+            self.validated.pop(graph, None)
+            return
+        if self.validated.get(graph, None) == mtime:
+            return
+        try:
+            raw = graph.read_bytes()
+        except FileNotFoundError:
+            self.validated.pop(graph, None)
+            return
+        try:
+            orjson.loads(self._decompress(raw))
+        except Exception:
+            # a truncated or corrupt stream is just as dirty as bad json
+            graph.unlink(missing_ok=True)
+            self.validated.pop(graph, None)
+            return
+        self.validated[graph] = mtime
+
+    def sweep(
+        self, paths: Optional[Iterable[Path]] = None, force: bool = False
+    ) -> None:
+        """Sweep the given graph files, or fall back to a directory scan
+        Paths handed in by the watcher are examined as-is — a change event
+        means the content moved, parsed or not — so one event costs one
+        file instead of re-walking GRAPH_ROOT
+        """
+        if paths is not None:
+            remaining = list(paths)
         else:
-            remaining = self.graphs
-        for graph, fn in zip(
-            remaining, self.pool.map(self._sweep_dirty_graph, remaining)
-        ):
-            self.parsed.add(graph)
-            logger.info(f"Examining {graph.name}")
+            self._collect_graphs()
+            if not force:
+                remaining = [
+                    graph
+                    for graph in self.graphs
+                    if self.parsed.get(graph, None) != graph.stat().st_mtime_ns
+                ]
+            else:
+                remaining = self.graphs
+        futures = {
+            self.pool.submit(self._sweep_dirty_graph, graph): graph
+            for graph in remaining
+        }
+        for future in as_completed(futures):
+            if not self.available:
+                break
+            graph = futures[future]
+            self._mark_parsed(graph)
+            logger.info("Examining %s", graph.name)
         logger.info("Graph sweep complete")
 
 
@@ -78,68 +202,69 @@ class GraphInfoUpdater(GraphManager):
     def __init__(self, compressor: Compressor, processes: Optional[int] = None):
         super().__init__(compressor, processes)
         self.graph_info: Dict[str, GraphInfo] = dict()
+        self.proc_pool = ProcessPoolExecutor(max_workers=processes)
 
-    def _load_nxgraph(self, graph: Path) -> nx.Graph:
-        """Return the graph data structure from url for further analysis"""
-        resolver = GraphResolver(HTTPS_SCHEME + graph.stem)
-        return resolver(self.compressor, True)
-
-    def _find_teleport_nodes(self, graph: Path) -> List[Node]:
-        """Create a random selection of teleportation nodes on application startup.
-        This would be a subset of nodes with a degree of 1.
+    def update_info(
+        self, paths: Optional[Iterable[Path]] = None, force: bool = False
+    ) -> None:
+        """Update graph info in app state
+        The per-graph work runs on a process pool and ships (stem, info)
+        results back; the shared graph_info dict is only touched here in
+        the parent. Watcher-provided paths skip the directory rescan
         """
-        G = self._load_nxgraph(graph)
-        total_teleport_nodes = [node for node in G.nodes() if G.degree(node) == 1]
-        limit = len(total_teleport_nodes) // 100
-        return [Node(id=node) for node in random.sample(total_teleport_nodes, limit)]
-
-    def _update_graph_info(self, graph: Path) -> None:
-        """Resolve graph information"""
-        compressor_module = import_module(self.compressor.value)
-        with compressor_module.open(graph, "rb") as f:
-            data = orjson.loads(f.read())
-            try:
-                self.graph_info[graph.stem] = GraphInfo(
-                    num_nodes=len(data["nodes"]),
-                    num_edges=len(data["edges"]),
-                    teleport_nodes=self._find_teleport_nodes(graph),
-                )
-            except Exception as e:
-                logger.error(f"{e} -> {graph.stem}")
-
-    def update_info(self, force: bool = False) -> None:
-        """Update graph info in app state"""
-        self._collect_graphs()
-        if not force:
-            remaining = [graph for graph in self.graphs if graph not in self.parsed]
+        if paths is not None:
+            remaining = list(paths)
         else:
-            remaining = self.graphs
-        for graph, fn in zip(
-            remaining, self.pool.map(self._update_graph_info, remaining)
-        ):
-            self.parsed.add(graph)
-            logger.info(f"Updated graph info for {graph.stem}")
+            self._collect_graphs()
+            if not force:
+                remaining = [
+                    graph
+                    for graph in self.graphs
+                    if self.parsed.get(graph, None) != graph.stat().st_mtime_ns
+                ]
+            else:
+                remaining = self.graphs
+        futures = {
+            self.proc_pool.submit(
+                _resolve_graph_info, graph, self.compressor
+            ): graph
+            for graph in remaining
+        }
+        for future in as_completed(futures):
+            if not self.available:
+                break
+            graph = futures[future]
+            info = future.result()
+            self._mark_parsed(graph)
+            if info is not None:
+                self.graph_info[graph.stem] = info
+            logger.info("Updated graph info for %s", graph.stem)
         logger.info("Graph update complete")
 
+    async def stop(self) -> None:
+        await super().stop()
+        self.proc_pool.shutdown()
+
 
 class GraphWatcher(GraphManager):
     async def run_scheduled_functions(
         self, loop: asyncio.BaseEventLoop, functions: List[Callable[[None], None]]
     ):
-        [await loop.run_in_executor(self.pool, fn) for fn in functions]
+        """Run the scheduled passes concurrently on the executor"""
+        await asyncio.gather(*[loop.run_in_executor(self.pool, fn) for fn in functions])
 
     async def watch_files(
         self, cleaner: GraphCleaner, updater: GraphInfoUpdater
     ) -> None:
         logger.info("Starting Graph Watch background task")
         try:
-            async for _changes in awatch(
+            async for changes in awatch(
                 GRAPH_ROOT,
                 watch_filter=GraphFilterExtension(),
                 ignore_permission_denied=True,
                 recursive=False,
             ):
-                await self._handle_changes(cleaner, updater, retry=True)
+                await self._handle_changes(cleaner, updater, changes, retry=True)
 
         except RuntimeError:
             logger.error("No active event loop found to run the watcher routine")
@@ -149,24 +274,38 @@ class GraphWatcher(GraphManager):
         return
 
     async def _handle_changes(
-        self, cleaner: GraphCleaner, updater: GraphInfoUpdater, retry: bool = False
+        self,
+        cleaner: GraphCleaner,
+        updater: GraphInfoUpdater,
+        changes: set[tuple[Change, str]],
+        retry: bool = False,
     ) -> None:
+        touched = [
+            Path(path) for change, path in changes if change != Change.deleted
+        ]
+        for change, path in changes:
+            if change == Change.deleted:
+                deleted = Path(path)
+                cleaner.parsed.pop(deleted, None)
+                updater.parsed.pop(deleted, None)
+                updater.graph_info.pop(deleted.stem, None)
+
         has_failed = False
         try:
-            async with asyncio.TaskGroup() as tg:
-                tg.create_task(
-                    self.run_scheduled_functions(
-                        asyncio.get_running_loop(),
-                        [cleaner.sweep, updater.update_info],
-                    )
-                )
-        except* PermissionError as PermissionErrorGroup:
-            logger.error(*[str(e)[:100] for e in PermissionErrorGroup.exceptions])
+            await self.run_scheduled_functions(
+                asyncio.get_running_loop(),
+                [
+                    partial(cleaner.sweep, paths=touched),
+                    partial(updater.update_info, paths=touched),
+                ],
+            )
+        except PermissionError as e:
+            logger.error(str(e)[:100])
             has_failed = True
-        except* EOFError as EOFGroup:
-            logger.error(*[str(e)[:100] for e in EOFGroup.exceptions])
+        except EOFError as e:
+            logger.error(str(e)[:100])
             has_failed = True
 
         if retry and has_failed:
             await asyncio.sleep(0.1)
-            await self._handle_changes(cleaner, updater, retry=True)
+            await self._handle_changes(cleaner, updater, changes, retry=True)
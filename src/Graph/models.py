@@ -1,18 +1,29 @@
 from __future__ import annotations
 
+import sys
+from dataclasses import dataclass
 from typing import List
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 
 class Node(BaseModel):
     id: str
 
+    @field_validator("id")
+    @classmethod
+    def _intern_id(cls, value: str) -> str:
+        """The same node id recurs across teleport lists, movement paths and
+        adjacency responses; interning lets every copy share one str object
+        """
+        return sys.intern(value)
+
     def __str__(self):
         return self.id
 
 
-class AdjList(BaseModel):
+@dataclass(slots=True)
+class AdjList:
     source: Node
     dest: List[Node]
 
@@ -1,27 +1,89 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
 from typing import Annotated, Callable, List
-from urllib.parse import urlparse
 
 import networkx as nx
-from fastapi import APIRouter, Depends, Request
+import orjson
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 
-from src.constants import Compressor
-from src.Graph.dependencies import get_crawled_urls, get_resolver, url_in_crawled
+from src.constants import GRAPH_ROOT, Compressor
+from src.Graph.dependencies import (
+    GraphResolver,
+    get_crawled_urls,
+    get_resolver,
+    url_in_crawled,
+)
 from src.Graph.models import GraphInfo
+from src.utils import netloc
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/graphs", tags=["graphs"])
 
+_all_body_cache: dict[int, bytes] = dict()
+
 
 @router.get("/all")
 async def graphs(crawled_urls: Annotated[List[str], Depends(get_crawled_urls)]):
-    """Return already crawled website graphs"""
-    return {
-        "crawled_urls": crawled_urls,
-    }
+    """Return already crawled website graphs
+    The serialized body is cached against the directory mtime, so repeat
+    calls while nothing changed on disk are a dict hit and a memory copy
+    """
+    mtime = os.stat(GRAPH_ROOT).st_mtime_ns
+    body = _all_body_cache.get(mtime, None)
+    if body is None:
+        _all_body_cache.clear()
+        body = orjson.dumps({"crawled_urls": crawled_urls})
+        _all_body_cache[mtime] = body
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/export")
+async def graph_export(
+    request: Request,
+    url: str,
+    url_crawled: Annotated[None, Depends(url_in_crawled)],
+    resolver: Annotated[GraphResolver, Depends(get_resolver)],
+):
+    """Return the stored node-link graph as-is, skipping decode and re-encode
+    When the store compressor is gzip and the client accepts it, the blob
+    on disk already is the wire format: serve it with Content-Encoding set
+    and let zero compression work happen on the request path
+    """
+    compressor = request.app.state.compressor
+    if compressor == Compressor.GZIP and "gzip" in request.headers.get(
+        "accept-encoding", ""
+    ):
+        return Response(
+            content=resolver.stored_bytes(compressor),
+            media_type="application/json",
+            headers={"Content-Encoding": "gzip"},
+        )
+    return Response(
+        content=resolver.raw_bytes(compressor),
+        media_type="application/json",
+    )
+
+
+@router.get("/stream")
+async def stream_graph(
+    request: Request,
+    url: str,
+    url_crawled: Annotated[None, Depends(url_in_crawled)],
+    resolver: Annotated[GraphResolver, Depends(get_resolver)],
+):
+    """Stream the adjacency of a stored graph as newline-delimited JSON"""
+    G = await asyncio.to_thread(resolver, request.app.state.compressor, True)
+    rows = (
+        orjson.dumps({"source": {"id": source}, "dest": [{"id": k} for k in dest_dict]})
+        + b"\n"
+        for source, dest_dict in G.adjacency()
+    )
+    return StreamingResponse(rows, media_type="application/x-ndjson")
 
 
 @router.get("/", response_model=GraphInfo)
@@ -32,9 +94,12 @@ async def graph_info(
     resolver: Annotated[Callable[[Compressor, bool], nx.Graph], Depends(get_resolver)],
 ):
     """Return graph information, if present"""
+    url_netloc = netloc(url)
     try:
-        return request.app.state.info_updater.graph_info[urlparse(url).netloc]
+        return request.app.state.info_updater.graph_info[url_netloc]
     except KeyError:
         logger.info("Computing graph info")
-        G = resolver(request.app.state.compressor, True)
-        return GraphInfo(num_nodes=G.number_of_nodes(), num_edges=G.number_of_edges())
+        G = await asyncio.to_thread(resolver, request.app.state.compressor, True)
+        info = GraphInfo(num_nodes=G.number_of_nodes(), num_edges=G.number_of_edges())
+        request.app.state.info_updater.graph_info[url_netloc] = info
+        return info
@@ -1,20 +1,33 @@
 from __future__ import annotations
 
-from functools import cached_property
+from dataclasses import dataclass
 from uuid import uuid4
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from src.Course.models import CourseComplete, CourseTracker
 
 
+@dataclass(slots=True)
+class LeaderboardAck:
+    """Internal response record; serialized natively by orjson without
+    an intermediate dict build
+    """
+
+    message: str
+
+
 class LeaderboardName(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     course_url: str
     moves: int
+    key: str = ""
 
-    @cached_property
-    def key(self) -> str:
-        return f"{self.course_url}:{self.moves}"
+    def model_post_init(self, __context) -> None:
+        # the key depends only on the frozen init args, so format it once
+        # here instead of on every access through a property descriptor
+        object.__setattr__(self, "key", f"{self.course_url}:{self.moves}")
 
 
 class LeaderboardDisplay(BaseModel):
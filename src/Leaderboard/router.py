@@ -1,11 +1,11 @@
 from typing import Annotated
 
 from fastapi import APIRouter, BackgroundTasks, Body, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 from src.Course.models import GameState
 from src.Course.tasks import write_to_leaderboard
-from src.Leaderboard.models import LeaderboardTracker
+from src.Leaderboard.models import LeaderboardAck, LeaderboardTracker
 from src.Stores.interfaces import ICacheRepository, ILeaderboardRepository
 
 router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
@@ -43,10 +43,10 @@ async def update_leaderboard(
             headers={"X-Availability": "Available"},
         )
     tasks.add_task(write_to_leaderboard, leaderboard_storage, course)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_201_CREATED,
         headers={"X-Availability": "Available"},
-        content={"message": "Adding course to leaderboard"},
+        content=LeaderboardAck(message="Adding course to leaderboard"),
     )
 
 
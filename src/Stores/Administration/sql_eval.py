@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, List, Optional, Type
+
+import tree_sitter_python as tspython
+from sqlalchemy.orm import DeclarativeBase
+from tree_sitter import Language, Node, Parser
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_py_language = Language(tspython.language())
+
+
+def _walk_python_files(root_dir: Path, exclude: frozenset[str]) -> tuple[Path, ...]:
+    """Collect the python files under root_dir, pruning excluded directories
+    before descending into them; os.walk hands out names directly, avoiding
+    the per-entry stat calls of Path.rglob
+    """
+    files: List[Path] = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = [d for d in dirnames if d not in exclude]
+        for name in filenames:
+            if name.endswith(".py"):
+                files.append(Path(dirpath) / name)
+    return tuple(files)
+
+
+def _read_if_declarative(file: Path) -> Optional[bytes]:
+    """Cheap bytes prefilter; a file cannot declare the schema base without
+    spelling DeclarativeBase somewhere in its source. Returns the bytes it
+    already read on a match so the parser does not hit the disk again
+    """
+    data = file.read_bytes()
+    return data if b"DeclarativeBase" in data else None
+
+
+class SchemaMapper:
+    """Map the DeclarativeBase subclasses of the project to the files declaring them
+    Development tooling for schema audits; not imported by the application runtime
+    """
+
+    def __init__(
+        self, root_dir: Path, exclude_dirs: Optional[List[str]] = None
+    ) -> None:
+        self.root_dir = root_dir
+        self.exclude_dirs = exclude_dirs or ["__pycache__", "alembic", "versions"]
+        self._exclude = frozenset(self.exclude_dirs)
+        self.parser = Parser(language=_py_language)
+        self.base_class: Optional[Type[DeclarativeBase]] = None
+        self.table_map: Dict[Path, List[type]] = defaultdict(list)
+
+    @cached_property
+    def python_files(self) -> tuple[Path, ...]:
+        return _walk_python_files(self.root_dir, self._exclude)
+
+    def find_base_import(self) -> Optional[Path]:
+        """Return the file declaring the DeclarativeBase subclass of the schema
+        Candidate files are prefiltered with a bytes containment check on a
+        worker pool, so tree-sitter only parses files that can actually match,
+        and the scan short-circuits on the first declaration found
+        """
+        with ThreadPoolExecutor() as executor:
+            for file, data in zip(
+                self.python_files,
+                executor.map(_read_if_declarative, self.python_files, chunksize=16),
+            ):
+                if data is None:
+                    continue
+                tree = self.parser.parse(data)
+                if self._has_base_declaration(tree.root_node):
+                    return file
+        return None
+
+    def _has_base_declaration(self, node: Node) -> bool:
+        """Detect a class definition inheriting directly from DeclarativeBase"""
+        if node.type == "class_definition":
+            superclasses = node.child_by_field_name("superclasses")
+            if superclasses is not None and b"DeclarativeBase" in superclasses.text:
+                return True
+        return any(self._has_base_declaration(child) for child in node.children)
+
+    def find_base_class(self, module: ModuleType) -> Optional[Type[DeclarativeBase]]:
+        """Return the DeclarativeBase subclass declared inside the given module"""
+        self.base_class = next(
+            (
+                subclass
+                for subclass in DeclarativeBase.__subclasses__()
+                if subclass.__module__ == module.__name__
+            ),
+            None,
+        )
+        return self.base_class
+
+    def map_tables(self) -> Dict[Path, List[type]]:
+        """Group every table of the schema under the file that declares it"""
+        if self.base_class is None:
+            return self.table_map
+        for sb in self.base_class.__subclasses__():
+            key = self.root_dir / (sb.__module__.replace(".", "/") + ".py")
+            self.table_map[key].append(sb)
+        return self.table_map
+
+
+class QueryFinder:
+    """Locate raw SQL query strings inside the project sources
+    Development tooling to keep raw text() queries in sync with the schema
+    """
+
+    def __init__(
+        self,
+        root_dir: Path,
+        exclude_dirs: Optional[List[str]] = None,
+        query_types: Optional[List[str]] = None,
+    ) -> None:
+        self.root_dir = root_dir
+        self.exclude_dirs = exclude_dirs or ["__pycache__", "alembic", "versions"]
+        self.query_types: List[str] = query_types or [
+            "select",
+            "insert into",
+            "update",
+            "delete from",
+            "create table",
+            "drop table",
+        ]
+        self._query_types_b = tuple(q.encode("utf-8") for q in self.query_types)
+        self._exclude = frozenset(self.exclude_dirs)
+        self.parser = Parser(language=_py_language)
+
+    @cached_property
+    def python_files(self) -> tuple[Path, ...]:
+        return _walk_python_files(self.root_dir, self._exclude)
+
+    def find_query_nodes(self, file: Path) -> List[Node]:
+        """Return the string nodes of a file that hold a raw SQL query"""
+        return self._query_nodes(file.read_bytes())
+
+    def _query_nodes(self, data: bytes) -> List[Node]:
+        """Scan parsed source bytes for query strings
+        Files whose raw bytes contain no query keyword at all are skipped
+        before any tree-sitter parse happens
+        """
+        lowered = data.lower()
+        if not any(q in lowered for q in self._query_types_b):
+            return []
+        tree = self.parser.parse(data)
+        return [
+            node
+            for node in self._string_nodes(tree.root_node)
+            if any(q in node.text.lower() for q in self._query_types_b)
+        ]
+
+    def _string_nodes(self, node: Node) -> List[Node]:
+        """Collect every string literal node in the parse tree"""
+        nodes: List[Node] = []
+        if node.type == "string":
+            nodes.append(node)
+        for child in node.children:
+            nodes.extend(self._string_nodes(child))
+        return nodes
+
+    def find_queries(self) -> Dict[Path, List[Node]]:
+        """Return every raw SQL query string found, grouped per file
+        File reads run ahead on a worker pool while the current file parses,
+        overlapping disk I/O with the tree-sitter work
+        """
+        found: Dict[Path, List[Node]] = dict()
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for file, data in zip(
+                self.python_files,
+                executor.map(Path.read_bytes, self.python_files, chunksize=16),
+            ):
+                nodes = self._query_nodes(data)
+                if nodes:
+                    found[file] = nodes
+        return found
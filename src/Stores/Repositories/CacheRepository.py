@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+from collections import OrderedDict
 from enum import Enum
 from typing import Dict, List
 
@@ -33,24 +34,34 @@ def _match_engine(engine: StorageEngine) -> ILeaderboardRepository:
 
 
 class DictCacheRepository:
-    def __init__(self, storage_engine: ILeaderboardRepository):
+    def __init__(self, storage_engine: ILeaderboardRepository, max_entries: int = 1024):
         self.storage_engine: ILeaderboardRepository = storage_engine
-        self.client: Dict[str, CourseTracker] = dict()
+        self.client: OrderedDict[str, CourseTracker] = OrderedDict()
         self.client_modifiers: Dict[str, CourseModifiersHidden] = dict()
+        self.max_entries = max_entries
 
     def course_exists(self, course_id: str) -> bool:
-        return self.client.get(course_id, None) and self.client_modifiers.get(
-            course_id, None
-        )
+        return course_id in self.client and course_id in self.client_modifiers
 
     def get_course(self, course_id: str) -> CourseComplete | None:
-        return self.client.get(course_id, None)
+        course = self.client.get(course_id, None)
+        if course is not None:
+            self.client.move_to_end(course_id)
+        return course
 
     def get_course_modifiers(self, course_id: str) -> CourseModifiersHidden | None:
         return self.client_modifiers.get(course_id, None)
 
     def set_course(self, course_id: str, course: CourseComplete) -> None:
         self.client[course_id] = course
+        self.client.move_to_end(course_id)
+        if len(self.client) > self.max_entries:
+            evicted_id, evicted = self.client.popitem(last=False)
+            self.client_modifiers.pop(evicted_id, None)
+            try:
+                self.storage_engine.queue_tracker_object(evicted)
+            except Exception:
+                logger.error(f"Failed to flush evicted course {evicted_id} to storage")
 
     def set_course_modifiers(
         self, course_id: str, modifiers: CourseModifiersHidden
@@ -72,11 +83,18 @@ class DictCacheRepository:
 
 
 class MemcachedCacheRepository:
-    def __init__(self, storage_engine: ILeaderboardRepository):
+    def __init__(
+        self,
+        storage_engine: ILeaderboardRepository,
+        host: str = "localhost",
+        port: int = 11211,
+        flush_on_start: bool = False,
+    ):
         self.storage_engine: ILeaderboardRepository = storage_engine
-        self.client: PooledClient = PooledClient("localhost", 11211)
-        self.course_index: List[str] = list()
-        self.client.flush_all()
+        self.client: PooledClient = PooledClient((host, port))
+        self.course_index: set[str] = set()
+        if flush_on_start:
+            self.client.flush_all()
 
     def get_course(self, course_id: str) -> CourseTracker | None:
         if course_id not in self.course_index:
@@ -86,31 +104,71 @@ class MemcachedCacheRepository:
         if not tracker:
             return None
         try:
-            return CourseTracker(**orjson.loads(tracker))
-        except orjson.JSONDecodeError:
-            return None
+            return CourseTracker.model_validate_json(tracker)
         except ValidationError:
             return None
 
+    def get_courses(self, course_ids: List[str]) -> Dict[str, CourseTracker]:
+        """Fetch a batch of courses in one round-trip via get_many"""
+        wanted = [
+            course_id for course_id in course_ids if course_id in self.course_index
+        ]
+        if not wanted:
+            return dict()
+        try:
+            raw: Dict[str, bytes] = self.client.get_many(wanted)
+        except MemcacheError:
+            return dict()
+        courses: Dict[str, CourseTracker] = dict()
+        for course_id, payload in raw.items():
+            try:
+                courses[course_id] = CourseTracker.model_validate_json(payload)
+            except ValidationError:
+                continue
+        return courses
+
     def set_course(self, course_id: str, course: CourseTracker):
         try:
-            self.client.set(course_id, course.model_dump_json())
+            self.client.set(
+                course_id,
+                orjson.dumps(
+                    course.model_dump(),
+                    option=orjson.OPT_SERIALIZE_DATACLASS | orjson.OPT_NAIVE_UTC,
+                ),
+            )
         except MemcacheError:
             return
-        self.course_index.append(course_id)
+        self.course_index.add(course_id)
+
+    def set_courses(self, courses: Dict[str, CourseTracker]) -> None:
+        """Store a batch of courses in one round-trip via set_many"""
+        payload = {
+            course_id: orjson.dumps(
+                course.model_dump(),
+                option=orjson.OPT_SERIALIZE_DATACLASS | orjson.OPT_NAIVE_UTC,
+            )
+            for course_id, course in courses.items()
+        }
+        try:
+            failed = self.client.set_many(payload)
+        except MemcacheError:
+            return
+        self.course_index.update(
+            course_id for course_id in payload if course_id not in failed
+        )
 
     def delete_course(self, course_id: str):
         try:
             self.client.delete(course_id)
         except MemcacheError:
             return
-        self.course_index.remove(course_id)
+        self.course_index.discard(course_id)
 
     def write_to_storage(self, course_id: str):
         tracker_bytes: bytes | None = self.client.get(course_id)
         if not tracker_bytes:
             return
-        tracker = CourseTracker(**orjson.loads(tracker_bytes))
+        tracker = CourseTracker.model_validate_json(tracker_bytes)
 
         try:
             self.storage_engine.queue_tracker_object(course_id, tracker)
@@ -1,42 +1,157 @@
 from __future__ import annotations
 
-import inspect
 import logging
-from contextlib import contextmanager
+import threading
+from bisect import insort
 from pathlib import Path
-from typing import Dict, Generator, List
+from queue import Empty, Full, Queue
+from typing import Dict, Iterator, List
 from uuid import uuid4
 
 import orjson
-from sqlalchemy import create_engine, text
+from pydantic import ValidationError
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 
 from src.Leaderboard.models import (
     LeaderboardComplete,
     LeaderboardDisplay,
-    LeaderboardName,
     LeaderboardTracker,
 )
-from src.Stores.errors import DatabaseBusyError
 
 logger = logging.getLogger(__name__)
 
 
+def _lb_key(course_url: str, moves: int) -> str:
+    """Key for one leaderboard; a plain format call instead of a full
+    LeaderboardName model construction on every repository access
+    """
+    return f"{course_url}:{moves}"
+
+
+def _sqlite_pragmas(dbapi_connection, _) -> None:
+    """Apply the tuned pragmas on every new connection
+    journal_mode persists in the database file, but synchronous,
+    temp_store, mmap and foreign_keys are per-connection — setting them
+    once on a single pooled connection leaves the rest at the defaults
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+# the TextClause objects are built once at import; per-call construction
+# defeated SQLAlchemy's compiled statement cache with a fresh object each
+# time and paid the clause parsing on every query
+_Q_INIT_LEADERBOARD = text(
+    """INSERT INTO leaderboard (course_url, moves)
+       VALUES (:course_url, :moves)
+       ON CONFLICT DO NOTHING
+       RETURNING uid;
+    """
+)
+_Q_QUERY_LEADERBOARD = text(
+    """SELECT d.uid, d.nickname, d.score, d.course_uid, d.stamp FROM leaderboard_display d
+       INNER JOIN leaderboard l
+       ON d.leaderboard_uid = l.uid
+       WHERE l.course_url = :course_url AND l.moves = :moves
+       ORDER BY d.score DESC
+       LIMIT :limit OFFSET :start
+    """
+)
+_Q_DROP_LEADERBOARD = text(
+    """DELETE FROM leaderboard
+       WHERE course_url = :course_url
+       AND moves = :moves
+       RETURNING uid;
+    """
+)
+_Q_UPDATE_LEADERBOARD = text(
+    """INSERT INTO leaderboard_display
+       (leaderboard_uid, uid, nickname, score, course_uid, tracker_uid)
+       VALUES (
+            (SELECT uid FROM leaderboard WHERE course_url = :course_url AND moves = :moves),
+            :display_uid, :nickname, :score, :course_uid, :tracker_uid
+       )
+       ON CONFLICT (leaderboard_uid, course_uid) DO NOTHING
+       RETURNING uid;
+    """
+)
+_Q_COURSE_EXISTS = text(
+    """SELECT EXISTS (
+           SELECT 1 FROM leaderboard_display d
+           INNER JOIN leaderboard l
+           ON d.leaderboard_uid = l.uid
+           WHERE l.course_url = :course_url
+           AND l.moves = :moves
+           AND d.course_uid = :course_uid
+       )
+    """
+)
+_Q_INSERT_TRACKER = text(
+    """INSERT INTO leaderboard_tracker
+       (uid, data)
+       VALUES (:uid, :data)
+    """
+)
+_Q_INSERT_TRACKER_RETURNING = text(
+    """INSERT INTO leaderboard_tracker
+       (uid, data)
+       VALUES (:uid, :data)
+       RETURNING uid
+    """
+)
+_Q_READ_TRACKER = text(
+    """SELECT data FROM leaderboard_tracker t
+       INNER JOIN leaderboard_display d
+       ON t.uid = d.tracker_uid
+       WHERE d.course_uid = :course_uid
+    """
+)
+_Q_QUERY_TRACKERS = text(
+    """SELECT data FROM leaderboard_tracker t
+       INNER JOIN leaderboard_display d
+       ON t.uid = d.tracker_uid
+       INNER JOIN leaderboard l
+       ON d.leaderboard_uid = l.uid
+       WHERE l.course_url = :course_url
+       AND l.moves = :moves
+       ORDER BY d.score DESC
+       LIMIT :limit OFFSET :start
+    """
+)
+
+
 class DictLeaderboardRepository:
     def __init__(self):
         self.leaderboards: Dict[str, List[LeaderboardDisplay]] = dict()
-        self.trackers: Dict[str, LeaderboardTracker] = dict()
+        # trackers grouped by (course_url, moves) with a reverse index by
+        # course uid, replacing the flat url:moves:uid string keys that
+        # every lookup had to split and compare
+        self.trackers: Dict[tuple[str, int], Dict[str, LeaderboardTracker]] = dict()
+        self._tracker_groups: Dict[str, tuple[str, int]] = dict()
+        # side indexes mapping course uid and display uid back to their
+        # leaderboard key, so membership checks skip the board scan
+        self._course_boards: Dict[str, str] = dict()
+        self._entry_boards: Dict[str, str] = dict()
 
     def backup(self, path: str) -> None:
         (Path(__file__).parent / f"{path}.leaderboards").write_bytes(
             orjson.dumps(self.leaderboards)
         )
         (Path(__file__).parent / f"{path}.trackers").write_bytes(
-            orjson.dumps(self.trackers)
+            orjson.dumps(
+                {_lb_key(*group): trackers for group, trackers in self.trackers.items()}
+            )
         )
 
     def init_leaderboard(self, course_url: str, moves: int) -> None:
-        leaderboard_key = LeaderboardName(course_url=course_url, moves=moves).key
+        leaderboard_key = _lb_key(course_url, moves)
         if leaderboard_key in self.leaderboards.keys():
             return
         self.leaderboards[leaderboard_key] = list()
@@ -44,9 +159,7 @@ class DictLeaderboardRepository:
     def query_leaderboard(
         self, course_url: str, max_moves: int, start: int = 0, limit: int | None = 100
     ) -> List[LeaderboardDisplay]:
-        leaderboard = self.leaderboards.get(
-            LeaderboardName(course_url=course_url, moves=max_moves).key, []
-        )
+        leaderboard = self.leaderboards.get(_lb_key(course_url, max_moves), [])
         if not leaderboard:
             return []
         if not limit:
@@ -54,128 +167,136 @@ class DictLeaderboardRepository:
         return leaderboard[start : start + limit]
 
     def drop_leaderboard(self, course_url: str, max_moves: int) -> None:
-        key = LeaderboardName(course_url=course_url, moves=max_moves).key
+        key = _lb_key(course_url, max_moves)
         leaderboard = self.leaderboards.get(key, [])
         if not leaderboard:
             return
+        for display in leaderboard:
+            self._course_boards.pop(display.course_uid, None)
+            self._entry_boards.pop(display.uid, None)
         self.leaderboards.pop(key)
 
     def invalidate(self, entry_id) -> None:
-        for leaderboard in self.leaderboards:
-            if entry_id in self.leaderboards[leaderboard]:
-                self.leaderboards[leaderboard].remove(entry_id)
+        # the old version compared the entry id against whole display
+        # objects across every board, so it scanned everything and never
+        # matched; the side index finds the one board to touch
+        key = self._entry_boards.pop(entry_id, None)
+        if key is None:
+            return
+        leaderboard = self.leaderboards.get(key, [])
+        for position, display in enumerate(leaderboard):
+            if display.uid == entry_id:
+                self._course_boards.pop(display.course_uid, None)
+                del leaderboard[position]
                 break
 
     def update_leaderboard(
         self, course_url: str, max_moves: int, entry: LeaderboardDisplay
     ) -> None:
-        self.leaderboards[
-            LeaderboardName(course_url=course_url, moves=max_moves).key
-        ].append(entry)
-        self._sort_leaderboard(course_url, max_moves)
+        key = _lb_key(course_url, max_moves)
+        # boards stay sorted by descending score, so one insert costs a
+        # bisection instead of a full re-sort of the list
+        insort(self.leaderboards[key], entry, key=lambda display: -display.score)
+        self._course_boards[entry.course_uid] = key
+        self._entry_boards[entry.uid] = key
 
     def course_exists(self, course_url: str, max_moves: int, course_uid: str) -> bool:
-        return course_uid in [
-            display.course_uid
-            for display in self.query_leaderboard(
-                course_url=course_url,
-                max_moves=max_moves,
-                limit=None,
-            )
-        ]
+        return self._course_boards.get(course_uid, None) == _lb_key(
+            course_url, max_moves
+        )
 
     def queue_tracker_object(self, entry: LeaderboardComplete) -> None:
         self.write_tracker_object(entry)
 
     def write_tracker_object(self, entry: LeaderboardComplete) -> None:
-        key = f"{entry.url}:{entry.tracker.move_tracker.moves_target}:{entry.uid}"
-        self.trackers[key] = entry.tracker
+        group = (entry.url, entry.tracker.move_tracker.moves_target.value)
+        self.trackers.setdefault(group, dict())[entry.uid] = entry.tracker
+        self._tracker_groups[entry.uid] = group
 
     def read_tracker_object(self, course_id: str) -> LeaderboardTracker | None:
-        trackers = {
-            tracker_key: tracker
-            for tracker_key, tracker in self.trackers.items()
-            if course_id == tracker_key.split(":")[-1]
-        }
-        if not trackers.keys():
+        group = self._tracker_groups.get(course_id, None)
+        if group is None:
             return None
-        return trackers[list(trackers.keys())[-1]]
+        return self.trackers[group].get(course_id, None)
 
     def query_course_trackers(
         self, course_url: str, max_moves: int, start: int = 0, limit: int | None = 100
     ) -> List[LeaderboardTracker]:
-        trackers = [
-            tracker
-            for tracker_key, tracker in self.trackers.items()
-            if course_url == tracker_key.split(":")[0]
-            and max_moves == int(tracker_key.split(":")[1])
-        ]
+        trackers = list(self.trackers.get((course_url, max_moves), dict()).values())
         if not limit:
             return trackers[start:]
         return trackers[start : start + limit]
 
     def delete_tracker_object(self, course_id: str) -> None:
-        trackers = {
-            tracker_key: tracker
-            for tracker_key, tracker in self.trackers.items()
-            if course_id == tracker_key.split(":")[-1]
-        }
-        if not trackers.keys():
+        group = self._tracker_groups.pop(course_id, None)
+        if group is None:
             return None
-        del self.trackers[list(trackers.keys())[-1]]
+        self.trackers[group].pop(course_id, None)
 
-    def _sort_leaderboard(self, course_url: str, max_moves: int) -> None:
-        _key = LeaderboardName(course_url=course_url, moves=max_moves).key
-        leaderboard = self.leaderboards.get(_key, list())
-        self.leaderboards[_key] = sorted(
-            leaderboard, key=lambda x: x.score, reverse=True
-        )
+    def stop(self) -> None:
+        pass
 
 
 class SQLiteLeaderboardRepository:
+    _TRACKER_BATCH_SIZE = 64
+
     def __init__(self, database_uri: str):
         self.database_uri = database_uri
-        self.engine = create_engine(self.database_uri)
-        self.busy = False
-        self._set_pragma()
-
-    def _set_pragma(self) -> None:
-        with self._flag_busy():
-            connection = self.engine.connect()
-            connection.execute(text("PRAGMA foreign_keys=ON"))
-            connection.execute(text("PRAGMA JOURNAL_MODE=WAL"))
-            connection.commit()
-            connection.close()
-
-    @contextmanager
-    def _flag_busy(self) -> Generator[None, None, None]:
+        self.engine = create_engine(
+            self.database_uri,
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        event.listen(self.engine, "connect", _sqlite_pragmas)
+        # one factory for the lifetime of the repository; building it per
+        # call paid class construction on every query. Rows are plain
+        # tuples here, so nothing needs refreshing after commit
+        self.Session = sessionmaker(self.engine, expire_on_commit=False)
+        self._create_indexes()
+        # bounded so a burst the writer cannot keep up with applies
+        # backpressure instead of buffering trackers into RAM; entries are
+        # pre-serialized (uid, payload) pairs so the single writer thread
+        # only runs the INSERT
+        self.tracker_queue: Queue[tuple[str, str] | None] = Queue(maxsize=1024)
+        self._writer = threading.Thread(target=self._drain_tracker_queue, daemon=True)
+        self._writer.start()
+
+    def _create_indexes(self) -> None:
+        """Create the indexes backing the hot queries
+        query_leaderboard and query_course_trackers filter on
+        (course_url, moves) and order by score, so without these every
+        call is a table scan plus a temp b-tree sort. The display index
+        covers every selected column, giving an index-only scan
+        """
+        statements = (
+            """CREATE UNIQUE INDEX IF NOT EXISTS ix_lb_url_moves
+               ON leaderboard (course_url, moves)""",
+            """CREATE INDEX IF NOT EXISTS ix_disp_lb_score
+               ON leaderboard_display
+               (leaderboard_uid, score DESC, uid, nickname, course_uid, stamp)""",
+            """CREATE INDEX IF NOT EXISTS ix_disp_course_uid
+               ON leaderboard_display (course_uid)""",
+            """CREATE UNIQUE INDEX IF NOT EXISTS ux_disp_board_course
+               ON leaderboard_display (leaderboard_uid, course_uid)""",
+        )
         try:
-            if self.busy:
-                raise DatabaseBusyError("Database is currently busy")
-            self.busy = True
-            logger.info("Database write lock aquired")
-            yield
-            self.busy = False
-            logger.info("Database write lock released")
-        except DatabaseBusyError as dbe:
-            logger.error(dbe)
+            with self.engine.connect() as connection:
+                for statement in statements:
+                    connection.execute(text(statement))
+                connection.commit()
+        except Exception as e:
+            # the tables are created by the migrations; a fresh database
+            # gets its indexes on the next startup
+            logger.error(f"Failed to create leaderboard indexes: {e}")
 
     def backup(self, path: str) -> None:
-        with self._flag_busy():
-            connection = self.engine.connect()
-            connection.execute(text(".backup :path"), {"path": path})
-            connection.close()
+        connection = self.engine.connect()
+        connection.execute(text(".backup :path"), {"path": path})
+        connection.close()
 
     def init_leaderboard(self, course_url: str, moves: int) -> None:
-        with sessionmaker(self.engine)() as session:
+        with self.Session() as session:
             result = session.execute(
-                text(
-                    """INSERT INTO leaderboard (course_url, moves)
-                       VALUES (:course_url, :moves)
-                       ON CONFLICT DO NOTHING
-                       RETURNING uid;
-                    """
-                ),
+                _Q_INIT_LEADERBOARD,
                 {"course_url": course_url, "moves": moves},
             )
             if not result.fetchone():
@@ -189,17 +310,9 @@ class SQLiteLeaderboardRepository:
     def query_leaderboard(
         self, course_url: str, max_moves: int, start: int = 0, limit: int | None = 100
     ) -> List[LeaderboardDisplay]:
-        with sessionmaker(self.engine)() as session:
+        with self.Session() as session:
             entries = session.execute(
-                text(
-                    """SELECT d.uid, d.nickname, d.score, d.course_uid, d.stamp FROM leaderboard_display d
-                       INNER JOIN leaderboard l
-                       ON d.leaderboard_uid = l.uid
-                       WHERE l.course_url = :course_url AND l.moves = :moves
-                       ORDER BY d.score DESC
-                       LIMIT :limit OFFSET :start
-                    """
-                ),
+                _Q_QUERY_LEADERBOARD,
                 {
                     "course_url": course_url,
                     "moves": max_moves,
@@ -210,22 +323,23 @@ class SQLiteLeaderboardRepository:
             result = entries.fetchall()
             if not result:
                 return list()
-            display_keys = inspect.signature(LeaderboardDisplay).parameters.keys()
+            # the SELECT projects the columns in declaration order and the
+            # rows are our own writes, so construction can skip validation
             return [
-                LeaderboardDisplay(**{el[0]: el[1] for el in zip(display_keys, entry)})
+                LeaderboardDisplay.model_construct(
+                    uid=entry[0],
+                    nickname=entry[1],
+                    score=entry[2],
+                    course_uid=entry[3],
+                    stamp=entry[4],
+                )
                 for entry in result
             ]
 
     def drop_leaderboard(self, course_url: str, max_moves: int) -> None:
-        with sessionmaker(self.engine)() as session:
+        with self.Session() as session:
             result = session.execute(
-                text(
-                    """DELETE FROM leaderboard
-                       WHERE course_url = :course_url
-                       AND moves = :moves
-                       RETURNING uid;
-                       """
-                ),
+                _Q_DROP_LEADERBOARD,
                 {"course_url": course_url, "moves": max_moves},
             )
             ids = result.fetchall()
@@ -248,18 +362,9 @@ class SQLiteLeaderboardRepository:
         entry: LeaderboardDisplay,
         tracker_uid: str,
     ) -> None:
-        with sessionmaker(self.engine)() as session:
+        with self.Session() as session:
             result = session.execute(
-                text(
-                    """INSERT INTO leaderboard_display
-                       (leaderboard_uid, uid, nickname, score, course_uid, tracker_uid)
-                       VALUES (
-                            (SELECT uid FROM leaderboard WHERE course_url = :course_url AND moves = :moves),
-                            :display_uid, :nickname, :score, :course_uid, :tracker_uid
-                       )
-                       RETURNING uid;
-                    """
-                ),
+                _Q_UPDATE_LEADERBOARD,
                 {
                     "course_url": course_url,
                     "moves": max_moves,
@@ -278,101 +383,131 @@ class SQLiteLeaderboardRepository:
             session.commit()
 
     def course_exists(self, course_url: str, max_moves: int, course_uid: str) -> bool:
-        with sessionmaker(self.engine)() as session:
-            entries = session.execute(
-                text(
-                    """SELECT d.course_uid FROM leaderboard_display d
-                       INNER JOIN leaderboard l
-                       ON d.leaderboard_uid = l.uid
-                       WHERE l.course_url = :course_url AND l.moves = :moves
-                    """
-                ),
+        with self.Session() as session:
+            result = session.execute(
+                _Q_COURSE_EXISTS,
                 {
                     "course_url": course_url,
                     "moves": max_moves,
+                    "course_uid": course_uid,
                 },
             )
-            result = entries.fetchall()
-            return course_uid in [el[0] for el in result]
+            return bool(result.scalar())
 
     def queue_tracker_object(self, entry: LeaderboardComplete) -> None:
-        self.write_tracker_object(entry)
+        # serialize on the producer so the dump runs concurrently across
+        # request handlers instead of on the writer's critical path
+        payload = (uuid4().hex, entry.tracker.model_dump_json())
+        try:
+            self.tracker_queue.put(payload, timeout=0.1)
+        except Full:
+            logger.error(f"Tracker queue full, dropping tracker for {entry.uid}")
+
+    def _drain_tracker_queue(self) -> None:
+        """Consume queued trackers on the writer thread
+        Blocks until an entry arrives, then drains whatever else is already
+        waiting (up to the batch size) so a burst of evictions costs one
+        transaction and one commit fsync instead of one per tracker
+        """
+        while True:
+            entry = self.tracker_queue.get()
+            if entry is None:
+                break
+            batch = [entry]
+            while len(batch) < self._TRACKER_BATCH_SIZE:
+                try:
+                    batch.append(self.tracker_queue.get_nowait())
+                except Empty:
+                    break
+            try:
+                self._write_tracker_batch(batch)
+            finally:
+                for _ in batch:
+                    self.tracker_queue.task_done()
 
-    def write_tracker_object(self, entry: LeaderboardComplete) -> None:
-        with self._flag_busy():
-            with sessionmaker(self.engine)() as session:
-                result = session.execute(
-                    text(
-                        """INSERT INTO leaderboard_tracker
-                           (uid, data)
-                           VALUES (:uid, :data)
-                           RETURNING uid
-                        """
-                    ),
-                    {"uid": uuid4().hex, "data": entry.tracker.model_dump_json()},
-                )
-                tracker_uid = result.fetchone()
-                if not tracker_uid:
-                    logger.error(
-                        f"Failed to insert tracker object for course {entry.uid}"
-                    )
-                    session.rollback()
-                    return
+    def _write_tracker_batch(self, batch: List[tuple[str, str]]) -> None:
+        params = [{"uid": uid, "data": data} for uid, data in batch]
+        try:
+            with self.Session() as session:
+                session.execute(_Q_INSERT_TRACKER, params)
                 session.commit()
-                return tracker_uid[0]
+        except Exception as e:
+            logger.error(f"Failed to write tracker batch of {len(batch)}: {e}")
+
+    def write_tracker_object(self, entry: LeaderboardComplete) -> None:
+        with self.Session() as session:
+            result = session.execute(
+                _Q_INSERT_TRACKER_RETURNING,
+                {"uid": uuid4().hex, "data": entry.tracker.model_dump_json()},
+            )
+            tracker_uid = result.fetchone()
+            if not tracker_uid:
+                logger.error(f"Failed to insert tracker object for course {entry.uid}")
+                session.rollback()
+                return
+            session.commit()
+            return tracker_uid[0]
 
     def read_tracker_object(self, course_id: str) -> LeaderboardTracker | None:
-        with sessionmaker(self.engine)() as session:
+        with self.Session() as session:
             tracker = session.execute(
-                text(
-                    """SELECT data FROM leaderboard_tracker t
-                       INNER JOIN leaderboard_display d
-                       ON t.uid = d.tracker_uid
-                       WHERE d.course_uid = :course_uid
-                    """
-                ),
+                _Q_READ_TRACKER,
                 {"course_uid": course_id},
             )
             result = tracker.fetchone()
             if not result:
                 return None
             try:
-                return LeaderboardTracker(**orjson.loads(result[-1]))
-            except orjson.JSONDecodeError:
+                # pydantic-core parses the stored JSON directly, skipping
+                # the orjson dict round-trip before validation
+                return LeaderboardTracker.model_validate_json(result[-1])
+            except ValidationError:
                 return None
 
-    def query_course_trackers(
+    def query_course_trackers_raw(
         self, course_url: str, max_moves: int, start: int = 0, limit: int | None = 100
-    ) -> List[LeaderboardTracker]:
-        with sessionmaker(self.engine)() as session:
-            trackers = session.execute(
-                text(
-                    """SELECT data FROM leaderboard_tracker t
-                       INNER JOIN leaderboard_display d
-                       ON t.uid = d.tracker_uid
-                       INNER JOIN leaderboard l
-                       ON d.leaderboard_uid = l.uid
-                       WHERE l.course_url = :course_url
-                       AND l.moves = :moves
-                       ORDER BY d.score DESC
-                       LIMIT :limit OFFSET :start
-                    """
-                ),
+    ) -> Iterator[bytes]:
+        """Stream the raw tracker payloads without parsing them
+        yield_per keeps the driver from materializing the whole result
+        set, so callers that only forward or count the documents never
+        pay the per-row model validation
+        """
+        with self.Session() as session:
+            rows = session.execute(
+                _Q_QUERY_TRACKERS,
                 {
                     "course_url": course_url,
                     "moves": max_moves,
                     "start": start,
                     "limit": limit,
                 },
+                execution_options={"yield_per": 100},
             )
-            results = trackers.fetchall()
-            if not results:
-                return list()
-            try:
-                return [LeaderboardTracker(**orjson.loads(el[0])) for el in results]
-            except orjson.JSONDecodeError:
-                logger.error("Failed to decode tracker object")
-                return list()
+            for row in rows:
+                yield row[0]
+
+    def query_course_trackers(
+        self, course_url: str, max_moves: int, start: int = 0, limit: int | None = 100
+    ) -> List[LeaderboardTracker]:
+        try:
+            return [
+                LeaderboardTracker.model_validate_json(data)
+                for data in self.query_course_trackers_raw(
+                    course_url, max_moves, start, limit
+                )
+            ]
+        except ValidationError:
+            logger.error("Failed to decode tracker object")
+            return list()
 
     def delete_tracker_object(self, course_id: str) -> None:
         raise NotImplementedError
+
+    def stop(self) -> None:
+        """Drain the tracker queue and stop the writer thread
+        The None sentinel lets the worker finish any batch in flight
+        instead of being killed mid-transaction with the process
+        """
+        self.tracker_queue.put(None)
+        self._writer.join(timeout=5)
+        self.engine.dispose()
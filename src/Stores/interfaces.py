@@ -67,6 +67,10 @@ class ILeaderboardRepository(Protocol):
         """Delete tracker object from permanent storage"""
         ...
 
+    def stop(self) -> None:
+        """Flush pending writes and stop any background workers"""
+        ...
+
 
 class ICacheRepository(Protocol):
     def course_exists(self, course_id: str) -> bool: ...
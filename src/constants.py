@@ -1,4 +1,5 @@
 from enum import Enum, StrEnum
+from importlib import import_module
 from pathlib import Path
 
 GRAPH_ROOT = Path(__file__).parent.parent / "graphs"
@@ -54,6 +55,7 @@ difficulty_ranges = {
 }
 
 compressor_extensions = {Compressor.GZIP.value: ".gz", Compressor.LZMA.value: ".xz"}
+compressor_modules = {c.value: import_module(c.value) for c in Compressor}
 
 HTTP_SCHEME = "http://"
 HTTPS_SCHEME = "https://"
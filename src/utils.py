@@ -1,4 +1,7 @@
+import sys
+from functools import lru_cache
 from pathlib import Path
+from urllib.parse import urlparse
 
 from src.constants import Compressor, ConcurrentRequestLimit, CrawlDepth
 from src.Stores.interfaces import ICacheRepository, ILeaderboardRepository
@@ -9,6 +12,24 @@ from src.Stores.Repositories.LeaderboardRepository import (
 )
 
 
+@lru_cache(maxsize=8192)
+def netloc(url: str) -> str:
+    """
+    Memoized netloc extraction for the scheme://host[/path] shapes this API accepts
+
+    Args:
+        url (str): A url string, including scheme
+
+    Returns:
+        str: The network location part of the url
+    """
+    i = url.find("://")
+    if i == -1:
+        return sys.intern(urlparse(url).netloc)
+    j = url.find("/", i + 3)
+    return sys.intern(url[i + 3 : j] if j != -1 else url[i + 3 :])
+
+
 async def _match_compressor(compressor: str) -> Compressor:
     match compressor:
         case "lzma":